@@ -0,0 +1,14 @@
+"""Gunicorn config for LightDrive: gunicorn -c gunicorn_conf.py app:app
+
+A file server's workload is long-lived, I/O-bound transfers; threaded
+workers let downloads stream in parallel without stalling listings.
+"""
+import multiprocessing
+import os
+
+bind = "0.0.0.0:" + os.environ.get("PORT", "8000")
+workers = 2 * multiprocessing.cpu_count() + 1
+worker_class = "gthread"
+threads = 8
+# Large downloads/uploads legitimately run for minutes; never kill them.
+timeout = 0